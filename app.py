@@ -1,11 +1,24 @@
 import os
 import base64
+from collections.abc import Iterator
+import hashlib
 import io
-import urllib.parse
+import time
+from typing import TYPE_CHECKING
 import streamlit as st
 from dotenv import load_dotenv
-from openai import OpenAI
-from PIL import Image
+
+from styles import page_css
+
+# pyvips, httpx and openai are imported on first use to keep cold start fast;
+# PIL (and pillow-heif) only when pyvips is unavailable or can't decode the photo
+if TYPE_CHECKING:
+    from openai import OpenAI
+
+try:
+    import pybase64  # SIMD-accelerated base64
+except ImportError:  # fall back to stdlib
+    pybase64 = None
 
 # -----------------------------
 # Keys (Streamlit Cloud + local)
@@ -17,35 +30,32 @@ if not OPENAI_API_KEY:
     st.error("Missing OPENAI_API_KEY. Add it to Streamlit Secrets (TOML) or to a local .env file.")
     st.stop()
 
-client = OpenAI(api_key=OPENAI_API_KEY)
 
-# -----------------------------
-# Helpers
-# -----------------------------
-def b64_data_url(uploaded_file) -> str:
+@st.cache_resource
+def get_client(api_key: str) -> "OpenAI":
     """
-    Resize + compress uploaded image and convert to base64 data URL.
-    Prevents huge iPhone images from breaking API calls.
+    Build one OpenAI client per process.
+    Streamlit re-executes this script on every rerun, so the pooled HTTP/2
+    connection (and its TLS session) only survives if the client is cached.
     """
-    image = Image.open(uploaded_file)
-
-    # Resize if too large
-    max_size = (1024, 1024)
-    image.thumbnail(max_size)
-
-    buffer = io.BytesIO()
-    image = image.convert("RGB")  # ensure JPEG-safe
-    image.save(buffer, format="JPEG", quality=80)
-    buffer.seek(0)
-
-    b64 = base64.b64encode(buffer.read()).decode("utf-8")
-    return f"data:image/jpeg;base64,{b64}"
-
+    import httpx
+    from openai import DefaultHttpxClient, OpenAI
+
+    # DefaultHttpxClient keeps the SDK's own defaults (e.g. follow_redirects) alongside these overrides
+    http_client = DefaultHttpxClient(
+        http2=True,
+        timeout=httpx.Timeout(60.0, connect=5.0),
+        limits=httpx.Limits(max_keepalive_connections=10, max_connections=20),
+    )
+    return OpenAI(api_key=api_key, http_client=http_client)
 
-def run_triage(pet_profile: dict, concerns: str, image_data_url: str | None) -> str:
-    model = "gpt-4.1-mini"
+# -----------------------------
+# Prompt
+# -----------------------------
+TRIAGE_MODEL = "gpt-4.1-mini"
 
-    prompt_text = f"""
+# Kept free of any per-request values so every call shares the same prefix (OpenAI prompt caching).
+SYSTEM_PROMPT = """
 You are a pet health triage assistant. You are NOT a veterinarian and you must not diagnose.
 
 Your job: help the user understand urgency, safe do/don't steps, and what to ask/tell a vet.
@@ -79,96 +89,174 @@ Return your answer in Markdown with these exact sections:
 
 ## Emergency red flags
 (list key red flags and say to seek emergency care if present)
+""".strip()
 
+USER_PROMPT_TEMPLATE = """
 Pet profile:
-- Name: {pet_profile.get("name")}
-- Species: {pet_profile.get("species")}
-- Breed: {pet_profile.get("breed")}
-- Age: {pet_profile.get("age")}
-- Weight: {pet_profile.get("weight")}
-- Sex: {pet_profile.get("sex")}
-- Known conditions: {pet_profile.get("conditions")}
-- Current meds: {pet_profile.get("meds")}
+- Name: {name}
+- Species: {species}
+- Breed: {breed}
+- Age: {age}
+- Weight: {weight}
+- Sex: {sex}
+- Known conditions: {conditions}
+- Current meds: {meds}
 
 Owner concerns:
 {concerns}
 """.strip()
 
+# -----------------------------
+# Helpers
+# -----------------------------
+def b64encode_str(data: bytes) -> str:
+    """Base64-encode bytes to str, using pybase64 when available."""
+    if pybase64 is not None:
+        return pybase64.b64encode_as_string(data)
+    return base64.b64encode(data).decode("utf-8")
+
+
+def load_pyvips():
+    """Import pyvips (streaming decode -> shrink -> encode); None if it or libvips is missing."""
+    try:
+        import pyvips
+    except (ImportError, OSError):
+        return None
+    return pyvips
+
+
+def register_heif():
+    """Let Pillow open iPhone HEIC/HEIF photos when pillow-heif is installed."""
+    try:
+        from pillow_heif import register_heif_opener
+    except ImportError:
+        return
+    register_heif_opener()
+
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def compress_image(data: bytes, max_side: int = 1024) -> bytes:
+    """
+    Resize + compress uploaded image bytes to JPEG bytes.
+    Prevents huge iPhone images from breaking API calls.
+    """
+    # Resize if too large
+    max_size = (max_side, max_side)
+    pyvips = load_pyvips()
+    if pyvips is not None:
+        try:
+            thumb = pyvips.Image.thumbnail_buffer(data, max_size[0], height=max_size[1], size="down")
+            return thumb.write_to_buffer(".jpg", Q=75, subsample_mode="on", optimize_coding=False, keep="none")
+        except pyvips.Error:
+            pass  # e.g. HEIC without a libvips HEVC decoder: let Pillow try
+
+    from PIL import Image, ImageOps
+
+    register_heif()
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", max_size)  # JPEG only: let libjpeg downscale while decoding
+    image = ImageOps.exif_transpose(image)  # match vips: apply EXIF rotation, then drop the tag
+    image.thumbnail(max_size, Image.Resampling.BILINEAR)
+
+    buffer = io.BytesIO()
+    image = image.convert("RGB")  # ensure JPEG-safe
+    image.save(buffer, format="JPEG", quality=75, subsampling=2, optimize=False, progressive=False)
+
+    return buffer.getvalue()
+
+
+def b64_data_url(jpeg_bytes: bytes) -> str:
+    """Convert JPEG bytes to a base64 data URL."""
+    return f"data:image/jpeg;base64,{b64encode_str(jpeg_bytes)}"
+
+
+# Uploaded photos are deleted by OpenAI after this long (3600s is the API minimum)
+FILE_TTL_SECONDS = 3600
+
+
+def image_input(jpeg_bytes: bytes) -> dict:
+    """
+    Build the input_image entry for a photo.
+    Uploads the raw bytes once via the Files API (cached per photo in session state,
+    re-uploaded before the file expires) and falls back to an inline data URL if the upload fails.
+    """
+    from openai import OpenAIError
+
+    key = hashlib.blake2b(jpeg_bytes, digest_size=16).hexdigest()
+    file_ids = st.session_state.setdefault("image_file_ids", {})
+
+    cached = file_ids.get(key)
+    if cached is None or cached[1] - time.time() < 300:
+        try:
+            file = get_client(OPENAI_API_KEY).files.create(
+                file=("photo.jpg", jpeg_bytes, "image/jpeg"),
+                purpose="vision",
+                expires_after={"anchor": "created_at", "seconds": FILE_TTL_SECONDS},
+            )
+        except OpenAIError:
+            return {"type": "input_image", "image_url": b64_data_url(jpeg_bytes)}
+        cached = file_ids[key] = (file.id, time.time() + FILE_TTL_SECONDS)
+
+    return {"type": "input_image", "file_id": cached[0]}
+
+
+def stream_triage(pet_profile: dict, concerns: str, image: dict | None) -> Iterator[str]:
+    """Stream the triage answer as Markdown text deltas."""
+    prompt_text = USER_PROMPT_TEMPLATE.format_map({**pet_profile, "concerns": concerns})
+
     content = [{"type": "input_text", "text": prompt_text}]
 
-    if image_data_url:
-        content.append({"type": "input_image", "image_url": image_data_url})
+    if image:
+        content.append(image)
 
-    response = client.responses.create(
-        model=model,
-        input=[{"role": "user", "content": content}],
-    )
+    with get_client(OPENAI_API_KEY).responses.stream(
+        model=TRIAGE_MODEL,
+        input=[
+            {"role": "system", "content": [{"type": "input_text", "text": SYSTEM_PROMPT}]},
+            {"role": "user", "content": content},
+        ],
+    ) as stream:
+        for event in stream:
+            if event.type == "response.output_text.delta":
+                yield event.delta
 
-    return response.output_text
 
+# Finished answers kept per session (oldest evicted first, expired after an hour)
+TRIAGE_CACHE_ENTRIES = 32
+TRIAGE_CACHE_TTL_SECONDS = 3600
 
-# -----------------------------
-# Background (paw pattern)
-# -----------------------------
-paw_svg = """
-<svg xmlns="http://www.w3.org/2000/svg" width="260" height="260" viewBox="0 0 260 260">
-  <g fill="rgba(255,255,255,0.06)">
-    <!-- paw 1 -->
-    <circle cx="60" cy="58" r="10"/>
-    <circle cx="85" cy="50" r="8"/>
-    <circle cx="105" cy="62" r="9"/>
-    <circle cx="80" cy="78" r="14"/>
-    <ellipse cx="85" cy="105" rx="26" ry="20"/>
-    <!-- paw 2 -->
-    <g transform="translate(130,120) rotate(-18)">
-      <circle cx="20" cy="12" r="10"/>
-      <circle cx="45" cy="5" r="8"/>
-      <circle cx="65" cy="15" r="9"/>
-      <circle cx="40" cy="32" r="14"/>
-      <ellipse cx="45" cy="60" rx="26" ry="20"/>
-    </g>
-    <!-- paw 3 -->
-    <g transform="translate(40,165) rotate(12)">
-      <circle cx="20" cy="12" r="10"/>
-      <circle cx="45" cy="5" r="8"/>
-      <circle cx="65" cy="15" r="9"/>
-      <circle cx="40" cy="32" r="14"/>
-      <ellipse cx="45" cy="60" rx="26" ry="20"/>
-    </g>
-  </g>
-</svg>
-""".strip()
 
-paw_bg = "data:image/svg+xml;utf8," + urllib.parse.quote(paw_svg)
+def triage_key(pet_profile: dict, concerns: str, img_hash: bytes | None) -> tuple:
+    """Hashable key identifying a triage request; the photo is keyed by its blake2b digest."""
+    return (tuple(sorted(pet_profile.items())), concerns, img_hash)
+
+
+def cached_triage(key: tuple) -> str | None:
+    """Return a finished answer for this request from session state, dropping expired ones."""
+    results = st.session_state.setdefault("triage_results", {})
+    now = time.time()
+    for expired in [k for k, (stored_at, _) in results.items() if now - stored_at > TRIAGE_CACHE_TTL_SECONDS]:
+        del results[expired]
+
+    cached = results.get(key)
+    return cached[1] if cached else None
+
+
+def store_triage(key: tuple, result_md: str) -> None:
+    """Remember a finished answer, evicting the oldest past TRIAGE_CACHE_ENTRIES."""
+    results = st.session_state.setdefault("triage_results", {})
+    results.pop(key, None)
+    results[key] = (time.time(), result_md)
+    while len(results) > TRIAGE_CACHE_ENTRIES:
+        del results[next(iter(results))]
+
 
 # -----------------------------
 # UI
 # -----------------------------
 st.set_page_config(page_title="Pet Health Helper", page_icon="🐾", layout="centered")
 
-st.markdown(
-    f"""
-<style>
-/* Background: dark + paw pattern */
-.stApp {{
-  background-color: #0f1117;
-  background-image: url("{paw_bg}");
-  background-repeat: repeat;
-  background-size: 340px 340px;
-}}
-
-h1, h2, h3, p, li {{ color: #ffffff; }}
-.small {{ color: #a0a6c0; font-size: 0.95rem; }}
-
-/* Make content panels pop a little */
-.block-container {{
-  padding-top: 2.2rem;
-  padding-bottom: 2rem;
-}}
-</style>
-""",
-    unsafe_allow_html=True,
-)
+st.markdown(page_css, unsafe_allow_html=True)
 
 st.title("🐾 Pet Health Helper")
 st.markdown(
@@ -223,10 +311,32 @@ concerns = st.text_area(
     height=150
 )
 
-uploaded = st.file_uploader("Upload a photo (optional)", type=["jpg", "jpeg", "png", "webp"])
+uploaded = st.file_uploader("Upload a photo (optional)", type=["jpg", "jpeg", "png", "webp", "heic", "heif"])
+
+# Reruns fire on every widget change; only reprocess the photo when it actually changes
+if uploaded:
+    large = uploaded.size > 10 * 1024 * 1024
+    if large:
+        st.warning("Image is very large, so it will be resized more aggressively.")
+
+    img_hash = hashlib.blake2b(uploaded.getvalue(), digest_size=16).digest()
+    if st.session_state.get("img_hash") != img_hash:
+        # Recorded before compressing so a bad file isn't retried, and never previews a stale photo
+        st.session_state.img_hash = img_hash
+        st.session_state.img_jpeg = None
+        st.session_state.img_error = True
+        try:
+            st.session_state.img_jpeg = compress_image(uploaded.getvalue(), max_side=768 if large else 1024)
+            st.session_state.img_error = False
+        except Exception:  # OSError, DecompressionBombError, ...
+            pass
+
+    if st.session_state.get("img_error"):
+        st.error("Could not read that image. Try a different photo.")
+        uploaded = None
 
 if uploaded:
-    st.image(uploaded, caption="Uploaded photo", use_container_width=True)
+    st.image(st.session_state.img_jpeg, caption="Uploaded photo", use_container_width=True)
 
 st.divider()
 
@@ -246,14 +356,27 @@ if st.button("Analyze & Generate Guidance", type="primary", use_container_width=
         st.error("Please describe symptoms first.")
         st.stop()
 
-    image_url = b64_data_url(uploaded) if uploaded else None
+    title_name = pet_profile["name"] if pet_profile["name"] != "Not provided" else "your pet"
+    output = st.empty()
 
     with st.spinner("Analyzing..."):
         try:
-            result_md = run_triage(pet_profile, concerns, image_url)
-            title_name = pet_profile["name"] if pet_profile["name"] != "Not provided" else "your pet"
-            st.markdown(f"## Results for {title_name}")
-            st.markdown(result_md)
+            with output.container():
+                st.markdown(f"## Results for {title_name}")
+
+                key = triage_key(pet_profile, concerns, st.session_state.img_hash if uploaded else None)
+                cached_md = cached_triage(key)
+
+                if cached_md:
+                    st.markdown(cached_md)
+                else:
+                    image = image_input(st.session_state.img_jpeg) if uploaded else None
+                    result_md = st.write_stream(stream_triage(pet_profile, concerns, image))
+                    if result_md:
+                        store_triage(key, result_md)
+                    else:
+                        st.warning("No guidance was returned. Please try again.")
         except Exception as e:
+            output.empty()
             st.error("Something went wrong while analyzing. Try again or use a smaller image.")
             st.exception(e)
\ No newline at end of file
@@ -0,0 +1,63 @@
+"""
+Static page styling.
+Lives in its own module so Streamlit builds it once per process instead of on every rerun.
+"""
+import base64
+
+# -----------------------------
+# Background (paw pattern)
+# -----------------------------
+paw_svg = """
+<svg xmlns="http://www.w3.org/2000/svg" width="260" height="260" viewBox="0 0 260 260">
+  <g fill="rgba(255,255,255,0.06)">
+    <!-- paw 1 -->
+    <circle cx="60" cy="58" r="10"/>
+    <circle cx="85" cy="50" r="8"/>
+    <circle cx="105" cy="62" r="9"/>
+    <circle cx="80" cy="78" r="14"/>
+    <ellipse cx="85" cy="105" rx="26" ry="20"/>
+    <!-- paw 2 -->
+    <g transform="translate(130,120) rotate(-18)">
+      <circle cx="20" cy="12" r="10"/>
+      <circle cx="45" cy="5" r="8"/>
+      <circle cx="65" cy="15" r="9"/>
+      <circle cx="40" cy="32" r="14"/>
+      <ellipse cx="45" cy="60" rx="26" ry="20"/>
+    </g>
+    <!-- paw 3 -->
+    <g transform="translate(40,165) rotate(12)">
+      <circle cx="20" cy="12" r="10"/>
+      <circle cx="45" cy="5" r="8"/>
+      <circle cx="65" cy="15" r="9"/>
+      <circle cx="40" cy="32" r="14"/>
+      <ellipse cx="45" cy="60" rx="26" ry="20"/>
+    </g>
+  </g>
+</svg>
+""".strip()
+
+paw_bg = "data:image/svg+xml;base64," + base64.b64encode(paw_svg.encode("utf-8")).decode("ascii")
+
+# -----------------------------
+# Page CSS
+# -----------------------------
+page_css = f"""
+<style>
+/* Background: dark + paw pattern */
+.stApp {{
+  background-color: #0f1117;
+  background-image: url("{paw_bg}");
+  background-repeat: repeat;
+  background-size: 340px 340px;
+}}
+
+h1, h2, h3, p, li {{ color: #ffffff; }}
+.small {{ color: #a0a6c0; font-size: 0.95rem; }}
+
+/* Make content panels pop a little */
+.block-container {{
+  padding-top: 2.2rem;
+  padding-bottom: 2rem;
+}}
+</style>
+"""